@@ -0,0 +1,169 @@
+#!/bin/env python
+
+# This script rearranges a processed voice dataset into the flat corpus structure preferred by MFA (Montreal Forced
+# Aligner). It is a faster replacement for the line-by-line loop of prepare_alignment.sh.
+#
+# The input directory contains one directory per speaker as created by organize_voice.py, each with an index.tsv:
+#
+#       <basename_of_audio_file_in_subdirectory> \t <voice-name> \t <emotion> \t <Intensity level 1-5> \t  <utterance text>
+#
+# For each entry whose audio file exists, the arranged directory receives a .lab file with the utterance text and a
+# symbolic link to the audio file, both named after the audio file basename.
+#
+# The script is incremental: the state of the last run is stored next to the arranged directory, and only entries that
+# have been added, changed or removed since then are touched. Missing audio files are not reported per line, but
+# collected into a summary file next to the arranged directory.
+#
+# This script only depends on the Python standard library, as it is run inside the MFA Docker container.
+
+import argparse
+import glob
+import json
+import os
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(
+        description="Rearrange a voice dataset with index.tsv files into MFA's flat corpus structure")
+    parser.add_argument("input_data_dir", help="Directory with one subdirectory containing an index.tsv per speaker")
+    parser.add_argument("arranged_data_dir", help="Output directory with .lab files and audio symlinks for MFA")
+    parser.add_argument("--jobs", "-j", type=int, default=8, help="Number of worker threads for writing the corpus")
+    parser.add_argument("--missing-report", default=None,
+                        help="File to write the list of missing audio files to "
+                             "(default: <arranged_data_dir>.missing.tsv)")
+    parser.add_argument("--rebuild", action="store_true",
+                        help="Rewrite all entries and remove all files of entries no longer listed in index.tsv")
+    return parser.parse_args()
+
+
+def read_index_files(input_data_dir):
+    """Reads all <speaker>/index.tsv files and returns a list of (fname, spkid, emotion, text) tuples."""
+    entries = []
+    for idxfile in sorted(glob.glob(os.path.join(input_data_dir, '*', 'index.tsv'))):
+        with open(idxfile, 'r', encoding='utf-8') as f:
+            for line in f:
+                fields = line.rstrip('\n').split('\t')
+                if len(fields) < 5:
+                    continue
+                fname, spkid, emotion, _, text = fields[:5]
+                entries.append((fname, spkid, emotion, text))
+    return entries
+
+
+def resolve_entries(input_data_dir, entries):
+    """Splits index entries into a dict of existing ones (fname -> (target, lab text)) and a list of missing paths.
+
+    Each audio directory is listed only once instead of testing every single file for existence.
+    """
+    dir_listings = {}
+    wanted = {}
+    missing = []
+    for fname, spkid, emotion, text in entries:
+        audio_dir = os.path.join(input_data_dir, spkid, emotion)
+        if audio_dir not in dir_listings:
+            try:
+                dir_listings[audio_dir] = set(os.listdir(audio_dir))
+            except FileNotFoundError:
+                dir_listings[audio_dir] = set()
+        fpath = os.path.join(audio_dir, fname)
+        if fname in dir_listings[audio_dir]:
+            # same whitespace handling as the unquoted echo of prepare_alignment.sh
+            wanted[fname] = (fpath, ' '.join(text.split()))
+        else:
+            missing.append((spkid, emotion, fpath))
+    return wanted, missing
+
+
+def lab_name(fname):
+    return os.path.splitext(fname)[0] + '.lab'
+
+
+def write_entry(arranged_data_dir, fname, target, text):
+    with open(os.path.join(arranged_data_dir, lab_name(fname)), 'w', encoding='utf-8') as f:
+        f.write(text + '\n')
+    link_path = os.path.join(arranged_data_dir, fname)
+    if os.path.lexists(link_path):
+        os.remove(link_path)
+    os.symlink(target, link_path)
+
+
+def remove_entry(arranged_data_dir, fname):
+    for name in (fname, lab_name(fname)):
+        path = os.path.join(arranged_data_dir, name)
+        if os.path.lexists(path):
+            os.remove(path)
+
+
+def load_state(state_path):
+    if not os.path.isfile(state_path):
+        return {}
+    with open(state_path, 'r', encoding='utf-8') as f:
+        return {fname: tuple(value) for fname, value in json.load(f).items()}
+
+
+def save_state(state_path, state):
+    tmp_path = state_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, state_path)
+
+
+def write_missing_report(report_path, missing):
+    with open(report_path, 'w', encoding='utf-8') as f:
+        for spkid, emotion, fpath in missing:
+            f.write(f'{spkid}\t{emotion}\t{fpath}\n')
+
+
+def main():
+    args = parse_arguments()
+    if not os.path.isdir(args.input_data_dir):
+        print(f"{args.input_data_dir} does not exist, exiting...")
+        sys.exit(1)
+    os.makedirs(args.arranged_data_dir, exist_ok=True)
+
+    # MFA would pick up any additional files inside the corpus directory, so state and report are kept next to it
+    corpus_base = os.path.normpath(args.arranged_data_dir)
+    state_path = corpus_base + '.state.json'
+    report_path = args.missing_report or corpus_base + '.missing.tsv'
+
+    # symlinks are made absolute, so that they stay valid independent of the working directory
+    input_data_dir = os.path.abspath(args.input_data_dir)
+    wanted, missing = resolve_entries(input_data_dir, read_index_files(input_data_dir))
+
+    # the previous state is needed on --rebuild as well, to remove entries that were dropped from index.tsv
+    previous = load_state(state_path)
+    present = set(os.listdir(args.arranged_data_dir))
+    to_write = [(fname, target, text) for fname, (target, text) in wanted.items()
+                if args.rebuild or previous.get(fname) != (target, text)
+                or fname not in present or lab_name(fname) not in present]
+    to_remove = {fname for fname in previous if fname not in wanted}
+    if args.rebuild:
+        # also remove leftovers of runs whose state is lost, i.e. every .lab file and audio symlink not wanted anymore
+        wanted_names = set(wanted) | {lab_name(fname) for fname in wanted}
+        to_remove.update(name for name in present if name not in wanted_names
+                         and (name.endswith('.lab') or os.path.islink(os.path.join(args.arranged_data_dir, name))))
+
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        # list() propagates exceptions of the workers
+        list(executor.map(lambda fname: remove_entry(args.arranged_data_dir, fname), to_remove))
+        list(executor.map(lambda entry: write_entry(args.arranged_data_dir, *entry), to_write))
+
+    save_state(state_path, {fname: list(value) for fname, value in wanted.items()})
+    write_missing_report(report_path, missing)
+
+    # an entry consists of the audio symlink and the .lab file, which may both be in to_remove
+    n_removed = len({lab_name(fname) for fname in to_remove})
+    print(f"Arranged corpus {args.arranged_data_dir}: {len(wanted)} entries, {len(to_write)} written, "
+          f"{n_removed} removed, {len(wanted) - len(to_write)} unchanged")
+    if missing:
+        print(f"Warning: {len(missing)} audio files listed in index.tsv do not exist and were skipped:")
+        for (spkid, emotion), count in sorted(Counter((s, e) for s, e, _ in missing).items()):
+            print(f"{spkid}/{emotion}: {count}")
+        print(f"See {report_path} for the full list.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/bin/env python
+
+# This script builds a compact columnar index of the MFA alignment output and joins it with the metadata of the
+# index.tsv files of the aligned voice datasets. The alignments are expected in MFA's JSON output format, i.e. as
+# written by `mfa align --output_format json` in alignment/docker_data/run_entire_pipeline.sh, one file per utterance:
+#
+#       {"start": 0.0, "end": 4.78, "tiers": {"words": {"type": "interval_tier", "entries": [[0.45, 0.81, "word"], ...]},
+#                                             "phones": {"type": "interval_tier", "entries": [[0.45, 0.52, "v"], ...]}}}
+#
+# The utterance id is the basename of the alignment file, which is the same as the basename of the audio file listed
+# in index.tsv. The JSON files are parsed once, in parallel, and written into an index directory of .npy files that
+# can be memory-mapped:
+#
+#   utterances_*.npy   one row per utterance: id, voice, emotion, intensity, start, end
+#   words_*.npy        one row per word interval: utterance row, start, end, label
+#   phones_*.npy       one row per phone interval: utterance row, start, end, label
+#   vocab_*.npy        string tables for the label, voice and emotion codes of the other arrays
+#
+# The class AlignmentIndex loads such an index and provides vectorized aggregate queries, e.g. phone durations per
+# emotion or speaking rate per intensity level. These are also available on the command line:
+#
+#       alignment_index.py build <alignment dir> <dataset dir> <index dir>
+#       alignment_index.py phone-durations <index dir> --by emotion [--phone a]
+#       alignment_index.py speaking-rate <index dir> --by intensity [--unit words]
+
+import argparse
+import json
+import os
+from multiprocessing import Pool
+
+import numpy as np
+from tqdm import tqdm
+
+from organize_voice import read_dataset_index, require_index_files
+
+TIERS = ('words', 'phones')
+SILENCE_LABELS = ('', 'sil', 'sp', 'spn', '<eps>')
+GROUP_COLUMNS = ('voice', 'emotion', 'intensity')
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Columnar index of MFA alignments joined with index.tsv metadata")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Parse all alignment JSON files into an index directory")
+    build.add_argument("alignment_dir", help="Output directory of mfa align with JSON files")
+    build.add_argument("data_dir", help="Voice directory with an index.tsv or directory of voice directories")
+    build.add_argument("index_dir", help="Output directory for the index")
+    build.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="Number of worker processes")
+
+    durations = subparsers.add_parser("phone-durations", help="Phone duration statistics per group")
+    durations.add_argument("index_dir", help="Index directory created with build")
+    durations.add_argument("--by", choices=GROUP_COLUMNS, default="emotion", help="Column to group by")
+    durations.add_argument("--phone", default=None, help="Restrict to a single phone")
+
+    rate = subparsers.add_parser("speaking-rate", help="Speaking rate per group")
+    rate.add_argument("index_dir", help="Index directory created with build")
+    rate.add_argument("--by", choices=GROUP_COLUMNS, default="intensity", help="Column to group by")
+    rate.add_argument("--unit", choices=TIERS, default="phones", help="Count phones or words per second")
+    return parser.parse_args()
+
+
+def find_alignment_files(alignment_dir):
+    alignment_files = []
+    for root, _, files in os.walk(alignment_dir):
+        for file in files:
+            if file.endswith('.json'):
+                alignment_files.append(os.path.join(root, file))
+    return sorted(alignment_files)
+
+
+def parse_alignment_file(file_path):
+    """Parses a single MFA JSON file into (utterance id, start, end, {tier: (starts, ends, labels)}) or returns
+    (utterance id, error message) if the file can't be read."""
+    utt_id = os.path.splitext(os.path.basename(file_path))[0]
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            alignment = json.load(f)
+        tiers = {}
+        for tier in TIERS:
+            entries = alignment['tiers'][tier]['entries'] if tier in alignment['tiers'] else []
+            starts = np.array([e[0] for e in entries], dtype=np.float32)
+            ends = np.array([e[1] for e in entries], dtype=np.float32)
+            tiers[tier] = (starts, ends, [e[2] for e in entries])
+        return utt_id, float(alignment.get('start', 0.0)), float(alignment.get('end', 0.0)), tiers
+    except (OSError, ValueError, KeyError, IndexError, TypeError) as e:
+        return utt_id, str(e)
+
+
+def read_metadata(data_dir):
+    """Returns a dict utterance id -> (voice, emotion, intensity) of all index.tsv files below data_dir."""
+    return {os.path.splitext(os.path.basename(path))[0]: (voice, emotion, intensity)
+            for path, voice, emotion, intensity, _ in read_dataset_index(data_dir)}
+
+
+def encode(values, vocab):
+    """Encodes a list of strings into int32 codes of vocab, a dict string -> code that is extended as needed."""
+    return np.array([vocab.setdefault(v, len(vocab)) for v in values], dtype=np.int32)
+
+
+def vocab_array(vocab):
+    return np.array(sorted(vocab, key=vocab.get), dtype=str)
+
+
+def build_index(alignment_dir, data_dir, index_dir, jobs=None):
+    alignment_files = find_alignment_files(alignment_dir)
+    metadata = read_metadata(data_dir)
+
+    vocabs = {name: {} for name in ('voice', 'emotion') + TIERS}
+    utterances = {'id': [], 'voice': [], 'emotion': [], 'intensity': [], 'start': [], 'end': []}
+    tier_parts = {tier: {'utt': [], 'start': [], 'end': [], 'label': []} for tier in TIERS}
+    unmatched = []
+    errors = []
+
+    with Pool(jobs) as pool:
+        results = pool.imap(parse_alignment_file, alignment_files, chunksize=64)
+        for result in tqdm(results, total=len(alignment_files), desc="Parsing alignments"):
+            if len(result) == 2:
+                errors.append(result)
+                continue
+            utt_id, start, end, tiers = result
+            if utt_id not in metadata:
+                unmatched.append(utt_id)
+                continue
+            voice, emotion, intensity = metadata[utt_id]
+            utt_row = len(utterances['id'])
+            utterances['id'].append(utt_id)
+            utterances['voice'].append(vocabs['voice'].setdefault(voice, len(vocabs['voice'])))
+            utterances['emotion'].append(vocabs['emotion'].setdefault(emotion, len(vocabs['emotion'])))
+            utterances['intensity'].append(intensity)
+            utterances['start'].append(start)
+            utterances['end'].append(end)
+            for tier, (starts, ends, labels) in tiers.items():
+                parts = tier_parts[tier]
+                parts['utt'].append(np.full(starts.size, utt_row, dtype=np.int32))
+                parts['start'].append(starts)
+                parts['end'].append(ends)
+                parts['label'].append(encode(labels, vocabs[tier]))
+
+    os.makedirs(index_dir, exist_ok=True)
+    np.save(os.path.join(index_dir, 'utterances_id.npy'), np.array(utterances['id'], dtype=str))
+    np.save(os.path.join(index_dir, 'utterances_voice.npy'), np.array(utterances['voice'], dtype=np.int32))
+    np.save(os.path.join(index_dir, 'utterances_emotion.npy'), np.array(utterances['emotion'], dtype=np.int32))
+    np.save(os.path.join(index_dir, 'utterances_intensity.npy'), np.array(utterances['intensity'], dtype=np.int8))
+    np.save(os.path.join(index_dir, 'utterances_start.npy'), np.array(utterances['start'], dtype=np.float32))
+    np.save(os.path.join(index_dir, 'utterances_end.npy'), np.array(utterances['end'], dtype=np.float32))
+    for tier, parts in tier_parts.items():
+        for column, dtype in (('utt', np.int32), ('start', np.float32), ('end', np.float32), ('label', np.int32)):
+            values = np.concatenate(parts[column]) if parts[column] else np.zeros(0, dtype=dtype)
+            np.save(os.path.join(index_dir, f'{tier}_{column}.npy'), values)
+    for name, vocab in vocabs.items():
+        np.save(os.path.join(index_dir, f'vocab_{name}.npy'), vocab_array(vocab))
+
+    return len(utterances['id']), unmatched, errors
+
+
+class AlignmentIndex:
+    """Read-only access to an index directory created by build_index(). All arrays are memory-mapped."""
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        self.utterances = self._load_table('utterances', ('id', 'voice', 'emotion', 'intensity', 'start', 'end'))
+        self.tiers = {tier: self._load_table(tier, ('utt', 'start', 'end', 'label')) for tier in TIERS}
+        self.vocab = {name: self._load(f'vocab_{name}') for name in ('voice', 'emotion') + TIERS}
+
+    def _load(self, name):
+        return np.load(os.path.join(self.index_dir, f'{name}.npy'), mmap_mode='r')
+
+    def _load_table(self, prefix, columns):
+        return {column: self._load(f'{prefix}_{column}') for column in columns}
+
+    def group_labels(self, by):
+        """Returns the group names of the given utterance column, indexed by group code."""
+        if by == 'intensity':
+            return np.arange(int(self.utterances['intensity'].max(initial=-1)) + 1)
+        return self.vocab[by]
+
+    def _group_codes(self, tier, by):
+        """Group code of every row of the given tier, looked up via its utterance."""
+        return np.asarray(self.utterances[by], dtype=np.int64)[self.tiers[tier]['utt']]
+
+    def speech_mask(self, tier):
+        """Boolean mask of all non-silence rows of the given tier."""
+        labels = self.tiers[tier]['label']
+        silence_codes = np.flatnonzero(np.isin(self.vocab[tier], SILENCE_LABELS))
+        return ~np.isin(labels, silence_codes)
+
+    def phone_durations(self, by='emotion', phone=None):
+        """Returns a dict group -> (count, mean duration, standard deviation) in seconds of all non-silence phones,
+        or of a single phone."""
+        table = self.tiers['phones']
+        mask = self.speech_mask('phones')
+        if phone is not None:
+            code = np.flatnonzero(self.vocab['phones'] == phone)
+            mask &= np.isin(table['label'], code)
+        durations = (np.asarray(table['end']) - np.asarray(table['start']))[mask].astype(np.float64)
+        codes = self._group_codes('phones', by)[mask]
+        valid = codes >= 0
+        durations, codes = durations[valid], codes[valid]
+
+        labels = self.group_labels(by)
+        counts = np.bincount(codes, minlength=len(labels))
+        sums = np.bincount(codes, weights=durations, minlength=len(labels))
+        squares = np.bincount(codes, weights=durations * durations, minlength=len(labels))
+        result = {}
+        for i in np.flatnonzero(counts):
+            mean = sums[i] / counts[i]
+            result[labels[i].item()] = (int(counts[i]), mean, np.sqrt(max(squares[i] / counts[i] - mean * mean, 0.0)))
+        return result
+
+    def speaking_rate(self, by='intensity', unit='phones'):
+        """Returns a dict group -> number of non-silence words or phones per second of articulation time, i.e. the
+        summed duration of all non-silence phones."""
+        phones = self.tiers['phones']
+        phone_mask = self.speech_mask('phones')
+        durations = (np.asarray(phones['end']) - np.asarray(phones['start']))[phone_mask].astype(np.float64)
+        phone_codes = self._group_codes('phones', by)[phone_mask]
+        unit_codes = self._group_codes(unit, by)[self.speech_mask(unit)]
+
+        labels = self.group_labels(by)
+        times = np.bincount(phone_codes[phone_codes >= 0], weights=durations[phone_codes >= 0],
+                            minlength=len(labels))
+        counts = np.bincount(unit_codes[unit_codes >= 0], minlength=len(labels))
+        return {labels[i].item(): counts[i] / times[i] for i in np.flatnonzero(times)}
+
+
+def main():
+    args = parse_arguments()
+
+    if args.command == 'build':
+        require_index_files(args.data_dir)
+        n_utterances, unmatched, errors = build_index(args.alignment_dir, args.data_dir, args.index_dir, args.jobs)
+        for utt_id, error in errors:
+            print(f"Error processing {utt_id}: {error}")
+        if unmatched:
+            print(f"Warning: {len(unmatched)} alignments without entry in index.tsv were skipped")
+        print(f"Index of {n_utterances} utterances written to {args.index_dir}")
+        return
+
+    index = AlignmentIndex(args.index_dir)
+    if args.command == 'phone-durations':
+        print(f"{args.by}\tcount\tmean\tstd")
+        for group, (count, mean, std) in index.phone_durations(args.by, args.phone).items():
+            print(f"{group}\t{count}\t{mean:.4f}\t{std:.4f}")
+    elif args.command == 'speaking-rate':
+        print(f"{args.by}\t{args.unit}/s")
+        for group, rate in index.speaking_rate(args.by, args.unit).items():
+            print(f"{group}\t{rate:.3f}")
+
+
+if __name__ == "__main__":
+    main()
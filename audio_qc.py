@@ -0,0 +1,421 @@
+#!/bin/env python
+
+# This script runs quality checks over all audio files listed in the index.tsv files of one or more voice datasets
+# created by organize_voice.py. For each file the following metrics are computed:
+#
+#   - format: sample rate, channels, subtype, number of frames and duration in seconds
+#   - clipping: peak level in dBFS, number and ratio of samples at or above the clipping level
+#   - level: RMS level and DC offset, as well as the integrated loudness according to ITU-R BS.1770 (K-weighting with
+#     absolute and relative gating) in LUFS
+#   - SNR: estimated signal-to-noise ratio in dB, derived from the energy distribution of 20 ms frames, i.e. the ratio
+#     between loud (speech) frames and quiet (background) frames
+#
+# PCM WAV files are read via memory-mapped buffers without decoding the whole file, all other formats (e.g. FLAC) are
+# read in blocks via soundfile. The metrics are computed block-wise, so that memory usage is bounded independent of
+# the length of a file, and the files are processed on a pool of worker processes.
+#
+# The results are written as one columnar NumPy .npz file, with one array per column. The columns path, voice, emotion
+# and intensity are taken from index.tsv, all other columns are metrics. The utterance text is not stored, it can be
+# joined from index.tsv via the path. The column "flags" is a bitmask of the FLAG_* values below that marks missing
+# files, clipping, inconsistent formats per voice and outliers per voice and emotion. Outliers are determined via the
+# robust z-score (median and median absolute deviation) of duration, RMS level, loudness and SNR.
+#
+# organize_voice.py also lists utterances in index.tsv for which no recording exists. These are marked as missing and
+# not as errors, which are reserved for files that exist but can't be read.
+
+import argparse
+import os
+import struct
+from collections import Counter
+from multiprocessing import Pool
+
+import numpy as np
+import soundfile as sf
+from scipy.signal import sosfilt
+from tqdm import tqdm
+
+from organize_voice import read_dataset_index, require_index_files
+
+FLAG_ERROR = 1
+FLAG_CLIPPING = 2
+FLAG_FORMAT = 4
+FLAG_DURATION = 8
+FLAG_RMS = 16
+FLAG_LOUDNESS = 32
+FLAG_SNR = 64
+FLAG_SILENT = 128
+FLAG_MISSING = 256
+
+FLAG_NAMES = {
+    FLAG_ERROR: 'error',
+    FLAG_CLIPPING: 'clipping',
+    FLAG_FORMAT: 'format',
+    FLAG_DURATION: 'duration',
+    FLAG_RMS: 'rms',
+    FLAG_LOUDNESS: 'loudness',
+    FLAG_SNR: 'snr',
+    FLAG_SILENT: 'silent',
+    FLAG_MISSING: 'missing',
+}
+
+# metric column -> flag set for outliers per voice and emotion
+OUTLIER_COLUMNS = {
+    'duration': FLAG_DURATION,
+    'rms_dbfs': FLAG_RMS,
+    'loudness_lufs': FLAG_LOUDNESS,
+    'snr_db': FLAG_SNR,
+}
+
+METRIC_COLUMNS = {
+    'samplerate': np.int32,
+    'channels': np.int16,
+    'frames': np.int64,
+    'duration': np.float64,
+    'peak_dbfs': np.float32,
+    'clipped_samples': np.int64,
+    'clip_ratio': np.float32,
+    'rms_dbfs': np.float32,
+    'dc_offset': np.float32,
+    'loudness_lufs': np.float32,
+    'snr_db': np.float32,
+}
+
+BLOCK_FRAMES = 65536
+SNR_FRAME_SECONDS = 0.02
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Quality checks for all audio files listed in index.tsv files")
+    parser.add_argument("data_dir", help="Voice directory with an index.tsv or directory of voice directories")
+    parser.add_argument("output_file", help="Output .npz file with one array per column")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--clip-level", type=float, default=0.999,
+                        help="Absolute sample value (full scale = 1.0) from which on a sample counts as clipped")
+    parser.add_argument("--max-clip-ratio", type=float, default=0.0,
+                        help="Flag files with a higher ratio of clipped samples")
+    parser.add_argument("--z-threshold", type=float, default=3.5,
+                        help="Robust z-score from which on a file is flagged as outlier within its voice and emotion")
+    return parser.parse_args()
+
+
+def wav_data_layout(file_path):
+    """Parses the RIFF header of a WAV file and returns (numpy dtype, sample width, channels, sample rate, data offset,
+    number of frames) for PCM/float data that can be memory-mapped, or None for anything else."""
+    with open(file_path, 'rb') as f:
+        riff = f.read(12)
+        if len(riff) < 12 or riff[:4] != b'RIFF' or riff[8:] != b'WAVE':
+            return None
+        fmt = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return None
+            chunk_id, chunk_size = struct.unpack('<4sI', header)
+            if chunk_id == b'fmt ':
+                fmt = f.read(chunk_size)
+                f.seek(chunk_size % 2, os.SEEK_CUR)
+            elif chunk_id == b'data':
+                data_offset = f.tell()
+                break
+            else:
+                f.seek(chunk_size + chunk_size % 2, os.SEEK_CUR)
+    if fmt is None or len(fmt) < 16:
+        return None
+
+    format_tag, channels, samplerate, _, block_align, bits = struct.unpack('<HHIIHH', fmt[:16])
+    if format_tag == 0xFFFE and len(fmt) >= 26:
+        # WAVE_FORMAT_EXTENSIBLE, the actual format tag is at the start of the sub format GUID
+        format_tag = struct.unpack('<H', fmt[24:26])[0]
+    width = bits // 8
+    if format_tag == 1 and bits in (8, 16, 24, 32):
+        dtype = {8: np.uint8, 16: np.int16, 24: np.uint8, 32: np.int32}[bits]
+    elif format_tag == 3 and bits == 32:
+        dtype = np.float32
+    else:
+        return None
+    if channels == 0 or block_align != channels * width:
+        return None
+
+    # the data chunk size can be wrong for files that have not been closed properly
+    data_size = min(chunk_size, os.path.getsize(file_path) - data_offset)
+    return dtype, width, channels, samplerate, data_offset, data_size // block_align
+
+
+def to_float(raw, width):
+    """Converts raw little-endian PCM/float samples to float64 in the range [-1.0, 1.0)."""
+    if width == 3:
+        # 24 bit: pad each sample to 4 bytes in the upper 3 bytes of an int32 and shift back with sign extension
+        padded = np.zeros((raw.size // 3, 4), dtype=np.uint8)
+        padded[:, 1:] = raw.reshape(-1, 3)
+        return (padded.view('<i4').ravel() >> 8) / float(1 << 23)
+    if raw.dtype == np.uint8:
+        return (raw.astype(np.float64) - 128.0) / 128.0
+    if raw.dtype == np.int16:
+        return raw / float(1 << 15)
+    if raw.dtype == np.int32:
+        return raw / float(1 << 31)
+    return raw.astype(np.float64)
+
+
+def read_blocks(file_path, block_frames=BLOCK_FRAMES):
+    """Returns (sample rate, channels, subtype, frames, block iterator) of an audio file. The iterator yields float64
+    arrays of shape (frames, channels)."""
+    info = sf.info(file_path)
+    layout = wav_data_layout(file_path) if info.format == 'WAV' else None
+
+    if layout is None:
+        blocks = sf.blocks(file_path, blocksize=block_frames, dtype='float64', always_2d=True)
+        return info.samplerate, info.channels, info.subtype, info.frames, blocks
+
+    dtype, width, channels, samplerate, data_offset, frames = layout
+
+    def mmap_blocks():
+        if frames == 0:
+            return
+        samples_per_frame = channels * (3 if width == 3 else 1)
+        data = np.memmap(file_path, dtype=np.dtype(dtype).newbyteorder('<'), mode='r',
+                         offset=data_offset, shape=(frames * samples_per_frame,))
+        step = block_frames * samples_per_frame
+        for start in range(0, data.size, step):
+            yield to_float(data[start:start + step], width).reshape(-1, channels)
+
+    return samplerate, channels, info.subtype, frames, mmap_blocks()
+
+
+def k_weighting_sos(samplerate):
+    """Second-order sections of the K-weighting filter of ITU-R BS.1770 for the given sample rate."""
+    # stage 1: high shelf modelling the acoustic effect of the head
+    gain, q, fc = 3.999843853973347, 0.7071752369554196, 1681.974450955533
+    k = np.tan(np.pi * fc / samplerate)
+    vh = 10 ** (gain / 20.0)
+    vb = vh ** 0.4996667741545416
+    a0 = 1.0 + k / q + k * k
+    shelf = [(vh + vb * k / q + k * k) / a0, 2.0 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0,
+             1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+
+    # stage 2: RLB high pass
+    q, fc = 0.5003270373238773, 38.13547087602444
+    k = np.tan(np.pi * fc / samplerate)
+    a0 = 1.0 + k / q + k * k
+    high_pass = [1.0, -2.0, 1.0, 1.0, 2.0 * (k * k - 1.0) / a0, (1.0 - k / q + k * k) / a0]
+
+    return np.array([shelf, high_pass])
+
+
+class FrameEnergy:
+    """Accumulates the sum of squares of consecutive non-overlapping frames over a sequence of blocks."""
+
+    def __init__(self, frame_len):
+        self.frame_len = max(int(frame_len), 1)
+        self.rest = np.zeros(0)
+        self.energies = []
+
+    def add(self, squares):
+        squares = np.concatenate([self.rest, squares]) if self.rest.size else squares
+        n_frames = squares.size // self.frame_len
+        if n_frames:
+            self.energies.append(squares[:n_frames * self.frame_len].reshape(n_frames, -1).sum(axis=1))
+        self.rest = squares[n_frames * self.frame_len:]
+
+    def mean_squares(self):
+        """Mean square of each complete frame."""
+        if not self.energies:
+            return np.zeros(0)
+        return np.concatenate(self.energies) / self.frame_len
+
+
+def gated_loudness(block_mean_squares, total_mean_square):
+    """Integrated loudness in LUFS from the channel-summed mean squares of 100 ms K-weighted blocks."""
+    if block_mean_squares.size >= 4:
+        # 400 ms gating blocks with 75% overlap
+        z = np.convolve(block_mean_squares, np.ones(4) / 4, mode='valid')
+    else:
+        z = np.array([total_mean_square])
+    with np.errstate(divide='ignore'):
+        loudness = -0.691 + 10 * np.log10(z)
+    z = z[loudness > -70.0]
+    if not z.size:
+        return np.nan
+    relative_gate = -0.691 + 10 * np.log10(z.mean()) - 10.0
+    with np.errstate(divide='ignore'):
+        z = z[-0.691 + 10 * np.log10(z) > relative_gate]
+    return float(-0.691 + 10 * np.log10(z.mean()))
+
+
+def to_db(value, reference=1.0):
+    if value <= 0:
+        return np.nan
+    return float(10 * np.log10(value / reference))
+
+
+def analyze_file(file_path, clip_level=0.999):
+    """Computes all metrics of a single audio file, see METRIC_COLUMNS. Returns (metrics dict, subtype)."""
+    samplerate, channels, subtype, frames, blocks = read_blocks(file_path)
+
+    sos = k_weighting_sos(samplerate)
+    zi = np.zeros((sos.shape[0], 2, channels))
+    loudness_frames = FrameEnergy(0.1 * samplerate)
+    snr_frames = FrameEnergy(SNR_FRAME_SECONDS * samplerate)
+    peak = 0.0
+    clipped = 0
+    total = 0.0
+    total_squares = 0.0
+    total_weighted_squares = 0.0
+    n_samples = 0
+
+    for block in blocks:
+        abs_block = np.abs(block)
+        peak = max(peak, float(abs_block.max()))
+        clipped += int(np.count_nonzero(abs_block >= clip_level))
+        total += float(block.sum())
+        squares = block * block
+        total_squares += float(squares.sum())
+        n_samples += block.size
+
+        weighted, zi = sosfilt(sos, block, axis=0, zi=zi)
+        weighted_squares = (weighted * weighted).sum(axis=1)
+        total_weighted_squares += float(weighted_squares.sum())
+        loudness_frames.add(weighted_squares)
+        snr_frames.add(squares.mean(axis=1))
+
+    metrics = dict.fromkeys(METRIC_COLUMNS, np.nan)
+    metrics.update(samplerate=samplerate, channels=channels, frames=frames, duration=frames / samplerate,
+                   clipped_samples=clipped)
+    if not n_samples:
+        return metrics, subtype
+
+    metrics['peak_dbfs'] = to_db(peak * peak)
+    metrics['clip_ratio'] = clipped / n_samples
+    metrics['rms_dbfs'] = to_db(total_squares / n_samples)
+    metrics['dc_offset'] = total / n_samples
+    metrics['loudness_lufs'] = gated_loudness(loudness_frames.mean_squares(),
+                                              total_weighted_squares / (n_samples / channels))
+
+    frame_energies = snr_frames.mean_squares()
+    if frame_energies.size:
+        noise, signal = np.percentile(frame_energies, [10, 95])
+        # a digital silence floor of -140 dBFS prevents infinite values for noise-free synthetic audio
+        metrics['snr_db'] = to_db(signal, max(noise, 1e-14)) if signal > 0 else np.nan
+    return metrics, subtype
+
+
+def _analyze_worker(task):
+    file_path, clip_level = task
+    if not os.path.exists(file_path):
+        return None, '', '', True
+    try:
+        metrics, subtype = analyze_file(file_path, clip_level)
+        return metrics, subtype, '', False
+    except Exception as e:
+        return None, '', str(e), False
+
+
+def robust_z_scores(values):
+    median = np.nanmedian(values)
+    mad = np.nanmedian(np.abs(values - median))
+    if not np.isfinite(mad) or mad == 0:
+        return np.zeros_like(values)
+    return 0.6745 * (values - median) / mad
+
+
+def flag_files(columns, max_clip_ratio, z_threshold):
+    """Computes the flags column from the metric columns."""
+    flags = np.zeros(len(columns['path']), dtype=np.uint16)
+    valid = (columns['error'] == '') & ~columns['missing']
+    flags[columns['error'] != ''] |= FLAG_ERROR
+    flags[columns['missing']] |= FLAG_MISSING
+    flags[(columns['clip_ratio'] > max_clip_ratio) & (columns['clipped_samples'] > 0)] |= FLAG_CLIPPING
+    flags[~np.isfinite(columns['loudness_lufs']) & valid] |= FLAG_SILENT
+
+    # format consistency: every file of a voice should have the most common sample rate, channels and subtype
+    for voice in np.unique(columns['voice']):
+        in_voice = (columns['voice'] == voice) & valid
+        for column in ('samplerate', 'channels', 'subtype'):
+            values = columns[column][in_voice]
+            if values.size:
+                most_common = Counter(values.tolist()).most_common(1)[0][0]
+                flags[in_voice & (columns[column] != most_common)] |= FLAG_FORMAT
+
+    groups = np.char.add(np.char.add(columns['voice'], '/'), columns['emotion'])
+    for group in np.unique(groups):
+        in_group = groups == group
+        for column, flag in OUTLIER_COLUMNS.items():
+            z = robust_z_scores(columns[column][in_group].astype(np.float64))
+            group_flags = flags[in_group]
+            group_flags[np.abs(z) > z_threshold] |= flag
+            flags[in_group] = group_flags
+    return flags
+
+
+def describe_flags(flags):
+    return ','.join(name for flag, name in FLAG_NAMES.items() if flags & flag)
+
+
+def load_results(results_file):
+    """Loads a result file written by this script into a dict of column name -> array."""
+    with np.load(results_file) as data:
+        return {column: data[column] for column in data.files}
+
+
+def run_qc(data_dir, jobs=None, clip_level=0.999, max_clip_ratio=0.0, z_threshold=3.5):
+    """Runs the quality checks on all files of the index.tsv files below data_dir and returns the columns."""
+    entries = read_dataset_index(data_dir)
+    n_files = len(entries)
+
+    columns = {
+        'path': np.array([e[0] for e in entries], dtype=str),
+        'voice': np.array([e[1] for e in entries], dtype=str),
+        'emotion': np.array([e[2] for e in entries], dtype=str),
+        'intensity': np.array([e[3] for e in entries], dtype=np.int8),
+    }
+    for column, dtype in METRIC_COLUMNS.items():
+        columns[column] = np.full(n_files, np.nan if np.issubdtype(dtype, np.floating) else 0, dtype=dtype)
+    subtypes = [''] * n_files
+    errors = [''] * n_files
+    missing = np.zeros(n_files, dtype=bool)
+
+    tasks = ((os.path.join(data_dir, e[0]), clip_level) for e in entries)
+    with Pool(jobs) as pool:
+        results = pool.imap(_analyze_worker, tasks, chunksize=16)
+        for i, (metrics, subtype, error, is_missing) in enumerate(tqdm(results, total=n_files,
+                                                                       desc="Analyzing audio files")):
+            if metrics is None:
+                errors[i] = error
+                missing[i] = is_missing
+                continue
+            for column, value in metrics.items():
+                columns[column][i] = value
+            subtypes[i] = subtype
+
+    columns['subtype'] = np.array(subtypes, dtype=str)
+    columns['error'] = np.array(errors, dtype=str)
+    columns['missing'] = missing
+    columns['flags'] = flag_files(columns, max_clip_ratio, z_threshold)
+    return columns
+
+
+def print_summary(columns):
+    flags = columns['flags']
+    print(f"\n{len(flags)} files analyzed, {np.count_nonzero(flags)} flagged, "
+          f"{np.count_nonzero(columns['missing'])} missing")
+    groups = np.char.add(np.char.add(columns['voice'], '/'), columns['emotion'])
+    for group in np.unique(groups[flags != 0]):
+        in_group = groups == group
+        counts = {name: int(np.count_nonzero(flags[in_group] & flag)) for flag, name in FLAG_NAMES.items()}
+        print(f"{group}: " + ', '.join(f"{name}: {count}" for name, count in counts.items() if count))
+    for path, error in zip(columns['path'][flags & FLAG_ERROR != 0], columns['error'][flags & FLAG_ERROR != 0]):
+        print(f"Error processing {path}: {error}")
+
+
+def main():
+    args = parse_arguments()
+    require_index_files(args.data_dir)
+
+    columns = run_qc(args.data_dir, args.jobs, args.clip_level, args.max_clip_ratio, args.z_threshold)
+    np.savez(args.output_file, **columns)
+    print_summary(columns)
+    print(f"Results written to {args.output_file}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+#!/bin/env python
+
+# This script benchmarks the processing scripts of this repository on synthetic corpora generated with synth_corpus.py.
+# For each corpus size, i.e. number of utterances per emotion script, a corpus is generated into a temporary directory
+# and each tool is timed on it:
+#
+#   organize_voice      organize_voice.process_files() for every voice
+#   intensity_norm      intensity_norm_script.create_normal_distribution() and process_script() for every voice script
+#   vadiate             vadiate.process_audio() for every organized audio file (requires silero-vad)
+#   prepare_alignment   building the MFA corpus from the organized dataset
+#   audio_qc            audio_qc.run_qc() on the organized dataset
+#
+# Each tool runs in a freshly spawned process, so that the reported peak RSS (resident set size) only belongs to that
+# tool. For tools with worker processes this is the peak RSS of the largest single process, i.e. the main process or
+# one of its workers, not the sum over all of them. Setup work, like loading the VAD model, is not part of the timing.
+#
+# Results are reported as files/s, MB/s and maximum single-process RSS in MB and are written to a JSON file, together
+# with the current git commit and whether the working tree had uncommitted changes. Pass the JSON file of an earlier
+# run via --compare to print the relative change in throughput.
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from synth_corpus import EMOTIONS, generate_corpus
+
+TOOLS = ('organize_voice', 'intensity_norm', 'vadiate', 'prepare_alignment', 'audio_qc')
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Benchmark the processing scripts on synthetic corpora",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--output", "-o", default="benchmark.json", help="Output JSON file with the results")
+    parser.add_argument("--compare", default=None, help="JSON file of an earlier run to compare the results with")
+    parser.add_argument("--sizes", default="10,50,200", help="Comma-separated list of utterances per emotion script")
+    parser.add_argument("--tools", default=','.join(TOOLS), help="Comma-separated list of tools to benchmark")
+    parser.add_argument("--voices", type=int, default=2, help="Number of voices of each corpus")
+    parser.add_argument("--emotions", default=','.join(EMOTIONS), help="Comma-separated list of emotions")
+    parser.add_argument("--max-takes", type=int, default=3, help="Maximum number of takes per utterance")
+    parser.add_argument("--min-duration", type=float, default=1.5, help="Minimum duration of a recording in seconds")
+    parser.add_argument("--max-duration", type=float, default=5.0, help="Maximum duration of a recording in seconds")
+    parser.add_argument("--sr", type=int, default=44100, help="Sampling rate")
+    parser.add_argument("--bits", type=int, choices=[16, 24], default=16, help="Bit depth")
+    parser.add_argument("--channels", type=int, default=1, help="Number of channels")
+    parser.add_argument("--flac", action="store_true", help="Convert to FLAC when organizing the voices")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(),
+                        help="Number of worker processes for tools that run in parallel")
+    parser.add_argument("--workdir", default=None, help="Directory for the temporary corpora (default: system temp)")
+    return parser.parse_args()
+
+
+def max_process_rss_mb():
+    """Peak RSS in MB of the largest single process among this process and its terminated children."""
+    peak = max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+               resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    # ru_maxrss is given in bytes on OS-X and in kilobytes on Linux
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def list_audio_files(data_dir):
+    audio_files = []
+    for root, _, files in os.walk(data_dir):
+        for file in files:
+            if file.lower().endswith(('.wav', '.flac')):
+                audio_files.append(os.path.join(root, file))
+    return sorted(audio_files)
+
+
+def total_size(paths):
+    return sum(os.path.getsize(p) for p in paths)
+
+
+def bench_organize_voice(corpus, raw_dir, organized_dir, jobs, use_flac):
+    from organize_voice import (create_directory_structure, get_emotions_and_addenda, process_files, read_script,
+                                write_index_file)
+
+    addenda_script = read_script(corpus['addenda_script'], is_emotion=False)
+    setups = []
+    for voice in corpus['voices']:
+        emotion_script = read_script(corpus['emotion_scripts'][voice], is_emotion=True)
+        emotions, addenda = get_emotions_and_addenda(raw_dir, voice)
+        dest_voice_dir = os.path.join(organized_dir, voice)
+        create_directory_structure(dest_voice_dir, emotions, addenda)
+        setups.append((voice, dest_voice_dir, emotion_script, addenda))
+
+    start = time.perf_counter()
+    for voice, dest_voice_dir, emotion_script, addenda in setups:
+        index_data, _ = process_files(raw_dir, dest_voice_dir, voice, voice, emotion_script, addenda_script, addenda,
+                                      ['neutral'], use_flac)
+        write_index_file(dest_voice_dir, index_data)
+    seconds = time.perf_counter() - start
+    return seconds, len(corpus['last_takes']), total_size(corpus['last_takes'])
+
+
+def bench_intensity_norm(corpus, raw_dir, organized_dir, jobs, use_flac):
+    from intensity_norm_script import create_normal_distribution, process_script
+
+    scripts = list(corpus['emotion_scripts'].values())
+    out_dir = tempfile.mkdtemp(dir=os.path.dirname(organized_dir))
+    start = time.perf_counter()
+    for script in scripts:
+        with open(script, 'r') as f:
+            num_lines = sum(1 for _ in f)
+        distribution = list(map(int, create_normal_distribution(num_lines, 3.2, 1.4, 1, 5).split()))
+        process_script(script, os.path.join(out_dir, os.path.basename(script)), distribution)
+    seconds = time.perf_counter() - start
+    shutil.rmtree(out_dir)
+    return seconds, len(scripts), total_size(scripts)
+
+
+def bench_vadiate(corpus, raw_dir, organized_dir, jobs, use_flac):
+    from silero_vad import load_silero_vad
+    from vadiate import process_audio
+
+    model = load_silero_vad()
+    audio_files = list_audio_files(organized_dir)
+    start = time.perf_counter()
+    for file_path in audio_files:
+        process_audio(file_path, model, organized_dir, False)
+    seconds = time.perf_counter() - start
+    return seconds, len(audio_files), total_size(audio_files)
+
+
+def bench_prepare_alignment(corpus, raw_dir, organized_dir, jobs, use_flac):
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'alignment', 'docker_data',
+                          'prepare_alignment.py')
+    arranged_dir = tempfile.mkdtemp(dir=os.path.dirname(organized_dir))
+    audio_files = list_audio_files(organized_dir)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, script, organized_dir, arranged_dir, '-j', str(jobs)], check=True,
+                   stdout=subprocess.DEVNULL)
+    seconds = time.perf_counter() - start
+    shutil.rmtree(arranged_dir)
+    # only the index and directory entries are read, so no bytes are counted
+    return seconds, len(audio_files), 0
+
+
+def bench_audio_qc(corpus, raw_dir, organized_dir, jobs, use_flac):
+    from audio_qc import run_qc
+
+    audio_files = list_audio_files(organized_dir)
+    start = time.perf_counter()
+    run_qc(organized_dir, jobs)
+    seconds = time.perf_counter() - start
+    return seconds, len(audio_files), total_size(audio_files)
+
+
+BENCHMARKS = {
+    'organize_voice': bench_organize_voice,
+    'intensity_norm': bench_intensity_norm,
+    'vadiate': bench_vadiate,
+    'prepare_alignment': bench_prepare_alignment,
+    'audio_qc': bench_audio_qc,
+}
+
+
+def _run_benchmark(tool, args, start_method, queue):
+    # a spawned process would otherwise also spawn the worker pools of the tools, instead of using the platform default
+    multiprocessing.set_start_method(start_method, force=True)
+    try:
+        # keep the progress bars and warnings of the tools out of the benchmark output
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            seconds, files, size = BENCHMARKS[tool](*args)
+        queue.put((seconds, files, size, max_process_rss_mb(), ''))
+    except ImportError as e:
+        queue.put((None, 0, 0, 0.0, f"skipped: {e}"))
+    except Exception as e:
+        queue.put((None, 0, 0, 0.0, f"failed: {e}"))
+
+
+def run_benchmark(tool, args):
+    """Runs a single benchmark in a new process and returns (seconds, files, bytes, max process RSS in MB, error)."""
+    ctx = multiprocessing.get_context('spawn')
+    queue = ctx.Queue()
+    process = ctx.Process(target=_run_benchmark, args=(tool, args, multiprocessing.get_start_method(), queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def git_commit():
+    """Returns (commit hash, dirty) of the repository, dirty is True if there are uncommitted changes."""
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True, check=True,
+                                cwd=repo_dir).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True,
+                                text=True, check=True, cwd=repo_dir).stdout
+        return commit, bool(status.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+
+
+def print_comparison(results, previous_file):
+    with open(previous_file, 'r', encoding='utf-8') as f:
+        previous = {(r['tool'], r['size']): r for r in json.load(f)['results']}
+    print(f"\nComparison with {previous_file}:")
+    print(f"{'tool':<20}{'size':>8}{'files/s':>12}{'before':>12}{'change':>10}{'RSS MB':>10}{'before':>10}")
+    for r in results:
+        old = previous.get((r['tool'], r['size']))
+        if old is None or not r['files_per_s'] or not old['files_per_s']:
+            continue
+        change = (r['files_per_s'] / old['files_per_s'] - 1) * 100
+        print(f"{r['tool']:<20}{r['size']:>8}{r['files_per_s']:>12.1f}{old['files_per_s']:>12.1f}{change:>+9.1f}%"
+              f"{r['max_process_rss_mb']:>10.1f}{old['max_process_rss_mb']:>10.1f}")
+
+
+def main():
+    args = parse_arguments()
+    sizes = [int(s) for s in args.sizes.split(',')]
+    tools = args.tools.split(',')
+    for tool in tools:
+        if tool not in BENCHMARKS:
+            print(f"Unknown tool '{tool}', choose from: {', '.join(TOOLS)}")
+            sys.exit(1)
+
+    results = []
+    print(f"{'tool':<20}{'size':>8}{'files':>8}{'seconds':>10}{'files/s':>12}{'MB/s':>10}{'RSS MB':>10}")
+    for size in sizes:
+        workdir = tempfile.mkdtemp(prefix='emospeech_bench_', dir=args.workdir)
+        try:
+            raw_dir = os.path.join(workdir, 'raw')
+            organized_dir = os.path.join(workdir, 'organized')
+            corpus = generate_corpus(raw_dir, args.voices, args.emotions.split(','), utterances=size,
+                                     addenda_utterances=max(size // 2, 1), max_takes=args.max_takes,
+                                     min_duration=args.min_duration, max_duration=args.max_duration,
+                                     sr=args.sr, bits=args.bits, channels=args.channels)
+            # the other tools work on the organized dataset, so organize_voice always runs first
+            for tool in ['organize_voice'] + [t for t in tools if t != 'organize_voice']:
+                seconds, files, size_bytes, rss, error = run_benchmark(
+                    tool, (corpus, raw_dir, organized_dir, args.jobs, args.flac))
+                if tool not in tools:
+                    continue
+                if error:
+                    print(f"{tool:<20}{size:>8}  {error}")
+                    continue
+                result = {
+                    'tool': tool,
+                    'size': size,
+                    'files': files,
+                    'bytes': size_bytes,
+                    'seconds': round(seconds, 4),
+                    'files_per_s': round(files / seconds, 2) if seconds else None,
+                    'mb_per_s': round(size_bytes / (1024 * 1024) / seconds, 2) if seconds else None,
+                    'max_process_rss_mb': round(rss, 1),
+                }
+                results.append(result)
+                print(f"{tool:<20}{size:>8}{files:>8}{seconds:>10.2f}{result['files_per_s'] or 0:>12.1f}"
+                      f"{result['mb_per_s'] or 0:>10.2f}{rss:>10.1f}")
+        finally:
+            shutil.rmtree(workdir)
+
+    commit, dirty = git_commit()
+    report = {
+        'commit': commit,
+        'dirty': dirty,
+        'date': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'compare', 'workdir')},
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.compare:
+        print_comparison(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
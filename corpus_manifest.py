@@ -0,0 +1,193 @@
+#!/bin/env python
+
+# This script builds a manifest of all audio files listed in the index.tsv files of one or more voice datasets created
+# by organize_voice.py. The manifest is a single SQLite database, that combines the metadata of index.tsv with the
+# format of each audio file, so that consumers like alignment preparation, VAD, quality checks or training data loaders
+# don't need to parse all index files and open every audio file again.
+#
+# The format of each file is determined by reading only its header, without decoding any audio, on a pool of threads.
+# The manifest is updated incrementally: headers are only read again for files whose size or modification time has
+# changed since the last run, and rows of files that are no longer listed in any index.tsv are removed.
+#
+# The table "files" has one row per entry of index.tsv:
+#
+#       path        path of the audio file relative to the dataset directory, e.g. <voice>/<emotion>/<file>.flac
+#       voice, emotion, intensity, text
+#                   the columns of index.tsv, intensity is -1 for entries without intensity level like the addenda
+#       present     1 if the audio file exists, 0 for utterances without recording
+#       frames, samplerate, channels, format, subtype, duration
+#                   audio format and duration in seconds, NULL if the file does not exist or can't be read
+#       size, mtime_ns
+#                   file size and modification time, used to detect changed files
+#
+# The table is indexed by voice, emotion and intensity. The absolute path of the dataset directory is stored in the
+# table "meta" under the key "data_dir".
+
+import argparse
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+import soundfile as sf
+
+from organize_voice import read_dataset_index, require_index_files
+
+AUDIO_COLUMNS = ('present', 'frames', 'samplerate', 'channels', 'format', 'subtype', 'duration', 'size', 'mtime_ns')
+COLUMNS = ('path', 'voice', 'emotion', 'intensity', 'text') + AUDIO_COLUMNS
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    voice TEXT NOT NULL,
+    emotion TEXT NOT NULL,
+    intensity INTEGER NOT NULL,
+    text TEXT,
+    present INTEGER NOT NULL,
+    frames INTEGER,
+    samplerate INTEGER,
+    channels INTEGER,
+    format TEXT,
+    subtype TEXT,
+    duration REAL,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS files_voice_emotion_intensity ON files (voice, emotion, intensity);
+CREATE INDEX IF NOT EXISTS files_emotion_intensity ON files (emotion, intensity);
+CREATE INDEX IF NOT EXISTS files_intensity ON files (intensity);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Manifest of all audio files listed in index.tsv files")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Create or update the manifest")
+    build.add_argument("data_dir", help="Voice directory with an index.tsv or directory of voice directories")
+    build.add_argument("manifest", help="SQLite manifest file")
+    build.add_argument("--jobs", "-j", type=int, default=16, help="Number of threads for reading file headers")
+
+    query = subparsers.add_parser("query", help="List files of the manifest")
+    query.add_argument("manifest", help="SQLite manifest file")
+    query.add_argument("--voice", default=None, help="Only files of this voice")
+    query.add_argument("--emotion", default=None, help="Only files of this emotion")
+    query.add_argument("--intensity", type=int, default=None, help="Only files of this intensity level")
+    query.add_argument("--summary", action="store_true",
+                       help="Print number of files and duration per voice and emotion instead of single files")
+    return parser.parse_args()
+
+
+def connect(manifest_path):
+    connection = sqlite3.connect(manifest_path)
+    connection.row_factory = sqlite3.Row
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def read_header(file_path, previous):
+    """Returns the audio columns of file_path. If size and modification time are the same as in the previous audio
+    columns, these are returned without opening the file."""
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return (0,) + (None,) * (len(AUDIO_COLUMNS) - 1)
+    if previous is not None and previous[-2:] == (stat.st_size, stat.st_mtime_ns):
+        return previous
+    try:
+        info = sf.info(file_path)
+        return (1, info.frames, info.samplerate, info.channels, info.format, info.subtype,
+                info.frames / info.samplerate, stat.st_size, stat.st_mtime_ns)
+    except RuntimeError:
+        return (1,) + (None,) * (len(AUDIO_COLUMNS) - 3) + (stat.st_size, stat.st_mtime_ns)
+
+
+def build_manifest(data_dir, manifest_path, jobs=16):
+    """Creates or updates the manifest and returns (number of files, number of headers read, number of missing
+    files, number of unreadable files)."""
+    entries = read_dataset_index(data_dir)
+
+    connection = connect(manifest_path)
+    with connection:
+        previous = {row[0]: tuple(row[1:]) for row in
+                    connection.execute(f"SELECT path, {', '.join(AUDIO_COLUMNS)} FROM files WHERE present = 1")}
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            audio = list(executor.map(lambda e: read_header(os.path.join(data_dir, e[0]), previous.get(e[0])),
+                                      entries))
+
+        connection.execute("CREATE TEMP TABLE listed (path TEXT PRIMARY KEY)")
+        connection.executemany("INSERT OR IGNORE INTO listed VALUES (?)", ((e[0],) for e in entries))
+        connection.execute("DELETE FROM files WHERE path NOT IN (SELECT path FROM listed)")
+        connection.execute("DROP TABLE listed")
+        connection.executemany(
+            f"INSERT OR REPLACE INTO files ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})",
+            (entry + columns for entry, columns in zip(entries, audio)))
+        connection.execute("INSERT OR REPLACE INTO meta VALUES ('data_dir', ?)", (os.path.abspath(data_dir),))
+    connection.close()
+
+    n_read = sum(1 for e, columns in zip(entries, audio) if columns[0] and columns != previous.get(e[0]))
+    n_missing = sum(1 for columns in audio if not columns[0])
+    n_unreadable = sum(1 for columns in audio if columns[0] and columns[1] is None)
+    return len(entries), n_read, n_missing, n_unreadable
+
+
+def _where(voice, emotion, intensity, present_only=True):
+    conditions = []
+    params = []
+    for column, value in (('voice', voice), ('emotion', emotion), ('intensity', intensity)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    if present_only:
+        conditions.append("present = 1")
+    return (f" WHERE {' AND '.join(conditions)}" if conditions else ""), params
+
+
+def query_files(manifest_path, voice=None, emotion=None, intensity=None, present_only=True):
+    """Returns the rows of all files matching the given voice, emotion and intensity as sqlite3.Row objects."""
+    where, params = _where(voice, emotion, intensity, present_only)
+    connection = connect(manifest_path)
+    rows = connection.execute(f"SELECT * FROM files{where} ORDER BY path", params).fetchall()
+    connection.close()
+    return rows
+
+
+def summarize(manifest_path, voice=None, emotion=None, intensity=None):
+    """Returns (voice, emotion, number of files, duration in seconds) per voice and emotion of all existing files."""
+    where, params = _where(voice, emotion, intensity)
+    connection = connect(manifest_path)
+    rows = connection.execute(f"SELECT voice, emotion, COUNT(*), TOTAL(duration) FROM files{where} "
+                              "GROUP BY voice, emotion ORDER BY voice, emotion", params).fetchall()
+    connection.close()
+    return [tuple(row) for row in rows]
+
+
+def main():
+    args = parse_arguments()
+
+    if args.command == 'build':
+        require_index_files(args.data_dir)
+        n_files, n_read, n_missing, n_unreadable = build_manifest(args.data_dir, args.manifest, args.jobs)
+        print(f"Manifest {args.manifest}: {n_files} files, {n_read} headers read, "
+              f"{n_files - n_read - n_missing} unchanged")
+        if n_missing:
+            print(f"Warning: {n_missing} files listed in index.tsv do not exist")
+        if n_unreadable:
+            print(f"Warning: {n_unreadable} files could not be read")
+        return
+
+    if args.summary:
+        print("voice\temotion\tfiles\thours")
+        for voice, emotion, count, duration in summarize(args.manifest, args.voice, args.emotion, args.intensity):
+            print(f"{voice}\t{emotion}\t{count}\t{duration / 3600:.3f}")
+    else:
+        for row in query_files(args.manifest, args.voice, args.emotion, args.intensity):
+            print(f"{row['path']}\t{row['duration']}\t{row['samplerate']}\t{row['subtype']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/bin/env python
+
+# This script normalizes the loudness of all audio files listed in the index.tsv files of one or more voice datasets
+# created by organize_voice.py and writes them with the same directory layout into a new destination directory.
+#
+# Normalization is done in two passes:
+#
+#   1. measure: the integrated loudness (ITU-R BS.1770, see audio_qc.py) and peak level of every file is measured in
+#      parallel. The measurements are cached in a JSON file together with size and modification time of each file,
+#      keyed by the path relative to the dataset directory, so only new or changed files are measured again on
+#      subsequent runs, e.g. when only the target level is changed.
+#   2. apply: a gain is computed for each file according to the chosen scope and written in a streaming fashion, block
+#      by block, on a pool of worker processes. The output files keep format and subtype of the source files.
+#
+# The gain scope can be one of:
+#
+#   file    each file is normalized to the target loudness
+#   voice   one gain per voice, that brings the median loudness of the voice to the target. This keeps the level
+#           differences between emotions and intensities of a voice.
+#   global  one gain for all files, that brings the median loudness of the whole corpus to the target
+#
+# In all scopes the gain of a file is reduced, if its peak level would otherwise exceed the given maximum peak level.
+
+import argparse
+import json
+import os
+import shutil
+import sys
+from collections import defaultdict
+from multiprocessing import Pool
+
+import numpy as np
+import soundfile as sf
+from tqdm import tqdm
+
+from audio_qc import BLOCK_FRAMES, analyze_file
+from organize_voice import find_index_files, read_dataset_index, require_index_files
+
+SCOPES = ('file', 'voice', 'global')
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Loudness normalization of all audio files listed in index.tsv files")
+    parser.add_argument("data_dir", help="Voice directory with an index.tsv or directory of voice directories")
+    parser.add_argument("dest_dir", help="Destination directory for the normalized dataset")
+    parser.add_argument("--target", type=float, default=-23.0, help="Target loudness in LUFS")
+    parser.add_argument("--scope", choices=SCOPES, default="voice", help="Compute gains per file, voice or globally")
+    parser.add_argument("--max-peak", type=float, default=-1.0, help="Maximum peak level in dBFS after normalization")
+    parser.add_argument("--jobs", "-j", type=int, default=os.cpu_count(), help="Number of worker processes")
+    parser.add_argument("--cache", default=None,
+                        help="Cache file for the loudness measurements (default: <dest_dir>/loudness.json)")
+    parser.add_argument("--measure-only", action="store_true", help="Only measure and update the cache")
+    return parser.parse_args()
+
+
+def file_signature(file_path):
+    stat = os.stat(file_path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def load_cache(cache_path):
+    if not os.path.isfile(cache_path):
+        return {}
+    with open(cache_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_cache(cache_path, cache):
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp_path, cache_path)
+
+
+def _measure_worker(task):
+    data_dir, rel_path = task
+    try:
+        file_path = os.path.join(data_dir, rel_path)
+        signature = file_signature(file_path)
+        metrics, _ = analyze_file(file_path)
+        return rel_path, signature, metrics['loudness_lufs'], metrics['peak_dbfs'], ''
+    except Exception as e:
+        return rel_path, None, np.nan, np.nan, str(e)
+
+
+def measure(data_dir, rel_paths, cache, jobs=None):
+    """Measures loudness and peak level of all files whose size or modification time differ from the cache entry.
+    The cache is keyed by the paths relative to data_dir, so that it stays valid independent of how data_dir is given.
+    Updates the cache in place, drops entries of files no longer listed and returns a list of paths of files that do
+    not exist, i.e. utterances without recording, and a list of (path, error) of files that couldn't be measured."""
+    for rel_path in set(cache) - set(rel_paths):
+        del cache[rel_path]
+
+    to_measure = []
+    missing = []
+    errors = []
+    for rel_path in rel_paths:
+        entry = cache.get(rel_path)
+        file_path = os.path.join(data_dir, rel_path)
+        if not os.path.exists(file_path):
+            cache.pop(rel_path, None)
+            missing.append(rel_path)
+        elif entry is None or entry['signature'] != file_signature(file_path):
+            to_measure.append(rel_path)
+
+    if not to_measure:
+        return missing, errors
+    with Pool(jobs) as pool:
+        results = pool.imap_unordered(_measure_worker, ((data_dir, p) for p in to_measure), chunksize=16)
+        for rel_path, signature, loudness, peak, error in tqdm(results, total=len(to_measure), desc="Measuring"):
+            if error:
+                cache.pop(rel_path, None)
+                errors.append((rel_path, error))
+                continue
+            # JSON has no NaN, silent files get a loudness of None
+            cache[rel_path] = {'signature': signature,
+                               'loudness': None if np.isnan(loudness) else loudness,
+                               'peak': None if np.isnan(peak) else peak}
+    return missing, errors
+
+
+def compute_gains(files, cache, target, scope, max_peak):
+    """Computes the gains of files, a list of entries as returned by organize_voice.read_dataset_index(). Returns a dict
+    relative path -> gain in dB, and the number of files whose gain was limited by max_peak."""
+    loudness = {rel_path: cache[rel_path]['loudness'] for rel_path, _, _, _, _ in files
+                if rel_path in cache and cache[rel_path]['loudness'] is not None}
+
+    if scope == 'file':
+        base_gains = {rel_path: target - value for rel_path, value in loudness.items()}
+    elif scope == 'voice':
+        voice_values = defaultdict(list)
+        for rel_path, voice, _, _, _ in files:
+            if rel_path in loudness:
+                voice_values[voice].append(loudness[rel_path])
+        voice_gains = {voice: target - float(np.median(values)) for voice, values in voice_values.items()}
+        base_gains = {rel_path: voice_gains[voice] for rel_path, voice, _, _, _ in files if voice in voice_gains}
+    else:
+        global_gain = target - float(np.median(list(loudness.values()))) if loudness else 0.0
+        base_gains = {rel_path: global_gain for rel_path, _, _, _, _ in files}
+
+    gains = {}
+    limited = 0
+    for rel_path, _, _, _, _ in files:
+        if rel_path not in cache:
+            continue
+        gain = base_gains.get(rel_path, 0.0)
+        peak = cache[rel_path]['peak']
+        if peak is not None and peak + gain > max_peak:
+            gain = max_peak - peak
+            limited += 1
+        gains[rel_path] = gain
+    return gains, limited
+
+
+def apply_gain(src_path, dest_path, gain_db, block_frames=BLOCK_FRAMES):
+    """Writes src_path scaled by gain_db to dest_path, block by block, with the same format and subtype."""
+    factor = 10 ** (gain_db / 20.0)
+    with sf.SoundFile(src_path) as src_file:
+        with sf.SoundFile(dest_path, mode='w', samplerate=src_file.samplerate, channels=src_file.channels,
+                          format=src_file.format, subtype=src_file.subtype) as dest_file:
+            for block in src_file.blocks(blocksize=block_frames, dtype='float64', always_2d=True):
+                dest_file.write(np.clip(block * factor, -1.0, 1.0))
+
+
+def _apply_worker(task):
+    src_path, dest_path, gain_db = task
+    try:
+        apply_gain(src_path, dest_path, gain_db)
+        return src_path, ''
+    except Exception as e:
+        return src_path, str(e)
+
+
+def main():
+    args = parse_arguments()
+    require_index_files(args.data_dir)
+    if os.path.abspath(args.data_dir) == os.path.abspath(args.dest_dir):
+        print("Destination directory must be different from the source directory")
+        sys.exit(1)
+
+    os.makedirs(args.dest_dir, exist_ok=True)
+    cache_path = args.cache or os.path.join(args.dest_dir, 'loudness.json')
+    files = read_dataset_index(args.data_dir)
+
+    cache = load_cache(cache_path)
+    missing, errors = measure(args.data_dir, [rel_path for rel_path, _, _, _, _ in files], cache, args.jobs)
+    save_cache(cache_path, cache)
+    for path, error in errors:
+        print(f"Error measuring {path}: {error}")
+    if missing:
+        print(f"Warning: {len(missing)} files listed in index.tsv do not exist and are skipped")
+    if args.measure_only:
+        print(f"Loudness measurements written to {cache_path}")
+        return
+
+    gains, limited = compute_gains(files, cache, args.target, args.scope, args.max_peak)
+
+    tasks = []
+    for rel_path, _, _, _, _ in files:
+        if rel_path not in gains:
+            continue
+        dest_path = os.path.join(args.dest_dir, rel_path)
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tasks.append((os.path.join(args.data_dir, rel_path), dest_path, gains[rel_path]))
+    for index_path in find_index_files(args.data_dir):
+        dest_index = os.path.join(args.dest_dir, os.path.relpath(index_path, args.data_dir))
+        os.makedirs(os.path.dirname(dest_index), exist_ok=True)
+        shutil.copy2(index_path, dest_index)
+
+    with Pool(args.jobs) as pool:
+        results = pool.imap_unordered(_apply_worker, tasks, chunksize=16)
+        for src_path, error in tqdm(results, total=len(tasks), desc="Normalizing"):
+            if error:
+                print(f"Error normalizing {src_path}: {error}")
+
+    print(f"{len(tasks)} files normalized to {args.target} LUFS ({args.scope} scope) in {args.dest_dir}")
+    if limited:
+        print(f"Warning: gain of {limited} files reduced to keep peaks below {args.max_peak} dBFS")
+    if errors:
+        print(f"Warning: {len(errors)} files could not be measured and were skipped")
+
+
+if __name__ == "__main__":
+    main()
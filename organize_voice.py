@@ -70,9 +70,11 @@
 
 import argparse
 from collections import Counter
+import glob
 import os
 import shutil
 import re
+import sys
 import soundfile as sf
 from tqdm import tqdm
 
@@ -222,6 +224,47 @@ def write_index_file(dest_dir, index_data):
     with open(index_path, 'w', encoding='utf-8') as f:
         f.writelines(index_data)
 
+
+# Return the index files below data_dir, which is either a single voice directory or a directory of voice directories
+def find_index_files(data_dir):
+    index_path = os.path.join(data_dir, 'index.tsv')
+    if os.path.isfile(index_path):
+        return [index_path]
+    return sorted(glob.glob(os.path.join(data_dir, '*', 'index.tsv')))
+
+
+# Read an index file as written by write_index_file() into a list of
+# (relative audio path, voice name, emotion, intensity, utterance text) tuples
+def read_index_file(index_path):
+    entries = []
+    with open(index_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t', 4)
+            if len(fields) < 5:
+                continue
+            basename, voice, emotion, intensity, utterance = fields
+            entries.append((os.path.join(emotion, basename), voice, emotion, intensity, utterance))
+    return entries
+
+
+# Read all index files below data_dir into a list of (audio path relative to data_dir, voice name, emotion, intensity,
+# utterance text) tuples. The intensity is parsed into an int, -1 for entries without intensity level like the addenda
+def read_dataset_index(data_dir):
+    entries = []
+    for index_path in find_index_files(data_dir):
+        voice_dir = os.path.relpath(os.path.dirname(index_path), data_dir)
+        for rel_path, voice, emotion, intensity, utterance in read_index_file(index_path):
+            entries.append((os.path.normpath(os.path.join(voice_dir, rel_path)), voice, emotion,
+                            int(intensity) if intensity.isdigit() else -1, utterance))
+    return entries
+
+
+# Exit with an error message if there is no index file below data_dir
+def require_index_files(data_dir):
+    if not find_index_files(data_dir):
+        print(f"No index.tsv found in {data_dir}")
+        sys.exit(1)
+
 def main():
     args = parse_arguments()
     dest_voice_dir = str(os.path.join(args.dest, args.dest_name))
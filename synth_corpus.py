@@ -0,0 +1,179 @@
+#!/bin/env python
+
+# This script generates a synthetic raw recording corpus, that has the same structure as the recordings made with
+# rec.py and expected by organize_voice.py. It can be used to test and benchmark the processing scripts without access
+# to real recordings.
+#
+# The generated directory layout is as follows:
+#
+#  output_directory /
+#    |
+#    +--voice001_neutral/
+#    |        |
+#    |        +--t3_004_1.wav
+#    |        +--t3_004_2.wav
+#    |        +--t3_011 _1.wav
+#    |        | ...
+#    +--voice001_addendum1/
+#    |        |
+#    |        +--t3a_001_1.wav
+#    |        | ...
+#    +--voice001_happy/
+#    |        ..
+#    +--scripts/
+#             |
+#             +--t3_intensity_script_voice001.txt
+#             +--t3_addendum.txt
+#
+# As in the real recordings, the unique ids are not monotonically increasing, there can be multiple takes per
+# utterance, some filenames contain a space after the unique id and some utterances have not been recorded at all.
+# The scripts use the same format as the files in scripts/, i.e. ( t3_001 "3: <utterance text>" ) for the emotion
+# scripts and ( t3a_001 "<utterance text>" ) for the addenda script.
+#
+# The audio consists of leading and trailing silence around a harmonic, syllable-modulated signal on top of a low noise
+# floor, which is close enough to speech for level measurements and VAD.
+
+import argparse
+import os
+
+import numpy as np
+import soundfile as sf
+
+EMOTIONS = ('neutral', 'happy', 'sad', 'angry', 'surprised', 'helpful')
+WORDS = ('hæ', 'halló', 'góðan', 'daginn', 'hvernig', 'hefur', 'þú', 'það', 'ég', 'er', 'bara', 'fínn', 'takk',
+         'fyrir', 'síðast', 'veðrið', 'í', 'dag', 'mjög', 'gott', 'kaffi', 'bíllinn', 'heima', 'á', 'morgun')
+
+
+def parse_arguments():
+    parser = argparse.ArgumentParser(description="Generate a synthetic raw recording corpus",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("output_dir", help="Output directory for the raw recordings and scripts")
+    parser.add_argument("--voices", type=int, default=2, help="Number of voices")
+    parser.add_argument("--emotions", default=','.join(EMOTIONS), help="Comma-separated list of emotions")
+    parser.add_argument("--addenda", type=int, default=1, help="Number of addenda directories per voice")
+    parser.add_argument("--utterances", type=int, default=20, help="Number of utterances of the emotion script")
+    parser.add_argument("--addenda-utterances", type=int, default=10, help="Number of utterances of the addenda script")
+    parser.add_argument("--max-takes", type=int, default=3, help="Maximum number of takes per utterance")
+    parser.add_argument("--space-ratio", type=float, default=0.05,
+                        help="Ratio of filenames with a space after the unique id")
+    parser.add_argument("--missing-ratio", type=float, default=0.01, help="Ratio of utterances without recording")
+    parser.add_argument("--min-duration", type=float, default=1.5, help="Minimum duration of a recording in seconds")
+    parser.add_argument("--max-duration", type=float, default=5.0, help="Maximum duration of a recording in seconds")
+    parser.add_argument("--sr", type=int, default=44100, help="Sampling rate")
+    parser.add_argument("--bits", type=int, choices=[16, 24], default=16, help="Bit depth")
+    parser.add_argument("--channels", type=int, default=1, help="Number of channels")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random number generator")
+    return parser.parse_args()
+
+
+def voice_names(n_voices):
+    # fixed width, so that no voice name is a prefix of another one
+    return [f'voice{i:03d}' for i in range(1, n_voices + 1)]
+
+
+def unique_ids(rng, n):
+    """Returns n sorted, non-consecutive unique ids, like the ids selected from another corpus."""
+    return np.sort(rng.choice(np.arange(1, 4 * n + 1), size=n, replace=False))
+
+
+def random_text(rng, min_words=3, max_words=12):
+    return ' '.join(rng.choice(WORDS, size=rng.integers(min_words, max_words + 1))).capitalize() + '.'
+
+
+def write_scripts(rng, scripts_dir, voices, n_utterances, n_addenda_utterances):
+    """Writes one emotion script per voice and one addenda script. Returns (dict voice -> emotion script path,
+    addenda script path)."""
+    os.makedirs(scripts_dir, exist_ok=True)
+    emotion_ids = unique_ids(rng, n_utterances)
+    emotion_texts = [random_text(rng) for _ in emotion_ids]
+    width = max(3, len(str(emotion_ids[-1])))
+
+    emotion_scripts = {}
+    for voice in voices:
+        # same utterances for every voice, but with individual intensity levels
+        intensities = rng.integers(1, 6, size=n_utterances)
+        script_path = os.path.join(scripts_dir, f't3_intensity_script_{voice}.txt')
+        with open(script_path, 'w', encoding='utf-8') as f:
+            for uid, intensity, text in zip(emotion_ids, intensities, emotion_texts):
+                f.write(f'( t3_{uid:0{width}d} "{intensity}: {text}" )\n')
+        emotion_scripts[voice] = script_path
+
+    addenda_script = os.path.join(scripts_dir, 't3_addendum.txt')
+    with open(addenda_script, 'w', encoding='utf-8') as f:
+        for uid in range(1, n_addenda_utterances + 1):
+            f.write(f'( t3a_{uid:03d} "{random_text(rng, 1, 4)}" )\n')
+    return emotion_scripts, addenda_script
+
+
+def synth_utterance(rng, duration, sr, channels):
+    """Returns a float array of shape (frames, channels) with a speech-like signal between silences."""
+    n = int(duration * sr)
+    t = np.arange(n) / sr
+    lead, trail = rng.uniform(0.15, 0.5, size=2)
+    voiced = (t >= lead) & (t < duration - trail)
+
+    # harmonics of a slowly varying fundamental frequency, amplitude-modulated at a syllable rate of ~4 Hz
+    f0 = rng.uniform(90, 250) * (1 + 0.1 * np.sin(2 * np.pi * rng.uniform(0.3, 1.0) * t))
+    phase = 2 * np.pi * np.cumsum(f0) / sr
+    signal = sum(np.sin(k * phase) / k for k in range(1, 6))
+    envelope = np.clip(np.sin(2 * np.pi * rng.uniform(3, 5) * t + rng.uniform(0, np.pi)), 0, None) ** 0.5
+    signal *= envelope * voiced * rng.uniform(0.1, 0.4)
+    signal += rng.normal(0, 10 ** (rng.uniform(-70, -50) / 20), size=n)
+
+    return np.repeat(signal[:, np.newaxis], channels, axis=1)
+
+
+def generate_corpus(output_dir, voices=2, emotions=EMOTIONS, addenda=1, utterances=20, addenda_utterances=10,
+                    max_takes=3, space_ratio=0.05, missing_ratio=0.01, min_duration=1.5, max_duration=5.0,
+                    sr=44100, bits=16, channels=1, seed=0):
+    """Generates a raw recording corpus in output_dir and returns a dict describing it: voice names, emotion and
+    addenda names, script paths per voice, the addenda script path and the list of the last takes of all recorded
+    utterances, which are the files picked by organize_voice.py."""
+    rng = np.random.default_rng(seed)
+    subtype = 'PCM_24' if bits == 24 else 'PCM_16'
+    names = voice_names(voices)
+    addenda_names = [f'addendum{i}' for i in range(1, addenda + 1)]
+    emotion_scripts, addenda_script = write_scripts(rng, os.path.join(output_dir, 'scripts'), names,
+                                                    utterances, addenda_utterances)
+
+    with open(emotion_scripts[names[0]], 'r', encoding='utf-8') as f:
+        emotion_uids = [line.split()[1] for line in f]
+    addenda_uids = [f't3a_{uid:03d}' for uid in range(1, addenda_utterances + 1)]
+
+    last_takes = []
+    for voice in names:
+        for emotion in list(emotions) + addenda_names:
+            recdir = os.path.join(output_dir, f'{voice}_{emotion}')
+            os.makedirs(recdir, exist_ok=True)
+            for uid in (addenda_uids if emotion.startswith('addendum') else emotion_uids):
+                if rng.random() < missing_ratio:
+                    continue
+                takes = int(rng.integers(1, max_takes + 1))
+                for take in range(1, takes + 1):
+                    space = ' ' if rng.random() < space_ratio else ''
+                    wav_file = os.path.join(recdir, f'{uid}{space}_{take}.wav')
+                    duration = rng.uniform(min_duration, max_duration)
+                    sf.write(wav_file, synth_utterance(rng, duration, sr, channels), sr, subtype=subtype)
+                last_takes.append(wav_file)
+
+    return {
+        'voices': names,
+        'emotions': list(emotions),
+        'addenda': addenda_names,
+        'emotion_scripts': emotion_scripts,
+        'addenda_script': addenda_script,
+        'last_takes': last_takes,
+    }
+
+
+def main():
+    args = parse_arguments()
+    corpus = generate_corpus(args.output_dir, args.voices, args.emotions.split(','), args.addenda, args.utterances,
+                             args.addenda_utterances, args.max_takes, args.space_ratio, args.missing_ratio,
+                             args.min_duration, args.max_duration, args.sr, args.bits, args.channels, args.seed)
+    print(f"Synthetic corpus with {len(corpus['voices'])} voices and {len(corpus['last_takes'])} recorded "
+          f"utterances written to {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()